@@ -1,18 +1,58 @@
 # forensics_logger.py
+import atexit
+import contextlib
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
 
 LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+# one stat when the directory already exists (the common case)
+if not os.path.isdir(LOG_DIR):
+    os.makedirs(LOG_DIR, exist_ok=True)
 
 logger = logging.getLogger("mlforensics")
 logger.setLevel(logging.DEBUG)
 
-# Rotating handler: keep artifacts reasonable for CI
+# Rotating handler: keep artifacts reasonable for CI. A larger maxBytes keeps
+# rotations rare under fuzzing volume; delay=True opens the file on first emit.
 handler = RotatingFileHandler(os.path.join(LOG_DIR, "forensics.log"),
-                              maxBytes=500_000, backupCount=3)
+                              maxBytes=5_000_000, backupCount=3, delay=True)
 fmt = "%(asctime)s %(levelname)s %(name)s %(filename)s:%(lineno)d %(message)s"
 handler.setFormatter(logging.Formatter(fmt))
+
+# Callers only enqueue records; a background listener thread does the file
+# writes (and rotations), so logging calls never block on disk I/O.
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+listener = QueueListener(log_queue, handler, respect_handler_level=True)
+_listening = False
 if not logger.handlers:
-    logger.addHandler(handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+    _listening = True
+    # stop() drains the queue before the process exits
+    atexit.register(listener.stop)
+
+@contextlib.contextmanager
+def listener_paused():
+    # Fork worker processes inside this block: the listener thread is stopped
+    # (after draining the queue), so no thread holds the queue's lock when
+    # the process is copied.
+    if not _listening:
+        yield
+        return
+    listener.stop()
+    try:
+        yield
+    finally:
+        listener.start()
+
+def use_direct_handler():
+    # For forked children: their copy of log_queue is never drained, so send
+    # records straight to the log file. Children only append; the parent's
+    # handler is the one that rotates.
+    logger.removeHandler(queue_handler)
+    direct = logging.FileHandler(handler.baseFilename, delay=True)
+    direct.setFormatter(handler.formatter)
+    logger.addHandler(direct)
@@ -4,25 +4,38 @@ Improved fuzz.py for MLForensics SQA project.
 
 - Tries to import target functions using multiple common module paths.
 - Uses forensics_logger if available (writes logs/forensics.log).
-- Writes a concise fuzz-results.log containing JSON records of failures.
+- Writes a concise fuzz-results.log containing one JSON record per line for
+  each distinct crash signature (buffered in memory and written in batches
+  through one open handle); repeats are only counted, in fuzz-summary.json.
 - Exits with status 1 if any failure was detected (so CI fails).
 - Tunable iterations via FUZZ_ITERATIONS env var.
+- Runs iterations across FUZZ_WORKERS processes (default: CPU count); the
+  parent collects the failure records and writes the logs.
+- Scratch files live in a per-run directory on /dev/shm when available.
 """
 
 import os
 import sys
+import atexit
+import collections
+import inspect
+import itertools
+import multiprocessing
+import shutil
 import time
 import json
 import random
 import string
 import tempfile
 import traceback
+import types
 from pathlib import Path
 
 # Try to import a shared forensic logger if present; otherwise fallback to simple logging
 try:
-    from forensics_logger import logger
+    from forensics_logger import logger, listener_paused, use_direct_handler
 except Exception:
+    import contextlib
     import logging
     logger = logging.getLogger("fuzz_fallback")
     if not logger.handlers:
@@ -32,6 +45,26 @@ except Exception:
         logger.addHandler(h)
     logger.setLevel(20)  # INFO
 
+    # the fallback logs from the calling thread, so forking needs no special care
+    def listener_paused():
+        return contextlib.nullcontext()
+
+    def use_direct_handler():
+        pass
+
+# Prefer orjson for serializing failure records when it is installed
+try:
+    import orjson
+
+    def _dumps(obj, indent=False):
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, default=str, option=option).decode("utf-8")
+except ImportError:
+    def _dumps(obj, indent=False):
+        if indent:
+            return json.dumps(obj, default=str, indent=2)
+        return json.dumps(obj, default=str, separators=(",", ":"))
+
 # -------------------------------------------------------------------
 # Resolve target functions (support multiple possible module names)
 # -------------------------------------------------------------------
@@ -95,46 +128,145 @@ if TARGETS["compute_token_frequency"] is None:
             logger.info(f"Resolved compute_token_frequency -> empirical.frequency.{alt}")
             break
 
+# The resolved targets and their (module, name) are fixed for the whole run,
+# so capture them once here; run_iteration binds them as default arguments.
+def _target_meta(fn):
+    return (getattr(fn, "__module__", None), getattr(fn, "__name__", str(fn)))
+
+_PARSER_FN = TARGETS["parse_python_file"] or TARGETS["getPythonParseObject"]
+_LINT_ENGINE = TARGETS["LintEngine"]
+_FREQ_FN = TARGETS["compute_token_frequency"]
+_REPORT_CLS = TARGETS["Report"]
+_MINER = TARGETS["mine_git_repo"]
+
+# Whether the lint/report targets are classes is loop-invariant; decide it
+# once here and bind it into run_iteration alongside the targets
+_LINT_IS_CLASS = isinstance(_LINT_ENGINE, type)
+_REPORT_IS_CLASS = isinstance(_REPORT_CLS, type)
+
+# Decide once whether the lint target takes a file path or source code,
+# based on the name of its first parameter, instead of catching TypeError
+_PATH_PARAMS = ("path", "file", "filename", "filepath", "py_file", "pyfile")
+
+def _wants_path(fn):
+    try:
+        params = [name for name in inspect.signature(fn).parameters if name != "self"]
+    except (TypeError, ValueError):
+        return False
+    return bool(params) and params[0].lower() in _PATH_PARAMS
+
+_LINT_WANTS_PATH = _wants_path(getattr(_LINT_ENGINE, "run", None) if _LINT_IS_CLASS else _LINT_ENGINE)
+
+_PARSER_META = _target_meta(_PARSER_FN)
+_LINT_META = _target_meta(_LINT_ENGINE)
+_FREQ_META = _target_meta(_FREQ_FN)
+_REPORT_META = _target_meta(_REPORT_CLS)
+_MINER_META = _target_meta(_MINER)
+
 # -------------------------------------------------------------------
 # Random generators
 # -------------------------------------------------------------------
 
+# One Random instance per process (reseeded in each worker), with its bound
+# methods held as module names instead of going through the random module.
+_RNG = random.Random(os.getpid() ^ time.time_ns())
+_choices = _RNG.choices
+_random = _RNG.random
+_randint = _RNG.randint
+
+_ALPHABET = string.ascii_letters + string.digits
+_CODE_TOKENS = ("def", "class", "return", "if", "else", "import", "for", "while")
+_PRINTABLE = range(32, 127)
+
+# NumPy (optional) builds long random text much faster than random.choices,
+# but its per-call overhead loses on short strings, so rand_text only uses it
+# from _NUMPY_MIN_LEN characters up.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_NUMPY_MIN_LEN = 64
+if np is not None:
+    _np_rng = np.random.default_rng()
+
 def rand_str(n=50):
-    return "".join(random.choice(string.ascii_letters + string.digits) for _ in range(n))
+    return "".join(_choices(_ALPHABET, k=n))
+
+def rand_text(n):
+    # printable ASCII only, so the text always encodes cleanly
+    if np is not None and n >= _NUMPY_MIN_LEN:
+        codes = _np_rng.integers(_PRINTABLE.start, _PRINTABLE.stop, size=n, dtype=np.uint8)
+        return codes.tobytes().decode("ascii")
+    return bytes(_choices(_PRINTABLE, k=n)).decode("ascii")
+
+# Scratch files go to a per-run directory on tmpfs (/dev/shm) when it is
+# writable, so iterations do not touch the disk. Paths come from a counter
+# rather than mkstemp, and files that must exist are written over a fixed
+# pool of names instead of being created and deleted every iteration.
+def _resolve_tmpfs_dir():
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+TMPFS_DIR = _resolve_tmpfs_dir()
+_RUN_DIR = tempfile.mkdtemp(prefix="fuzz-", dir=TMPFS_DIR)
+atexit.register(shutil.rmtree, _RUN_DIR, ignore_errors=True)
 
-def rand_path(suffix=".py", make_file=False, content=None):
-    # create a temp path; optionally write a small file
-    fd, p = tempfile.mkstemp(suffix=suffix)
-    os.close(fd)
+POOL_SIZE = 16
+_counter = itertools.count()
+
+def _reset_path_pool():
+    # pooled names carry the pid so forked workers never share a file
+    global _POOL, _pool_cycle
+    _POOL = [os.path.join(_RUN_DIR, f"fz_{os.getpid()}_pool{k}") for k in range(POOL_SIZE)]
+    _pool_cycle = itertools.cycle(_POOL)
+
+_reset_path_pool()
+
+def rand_path(suffix=".py", make_file=False, content=None,
+              _dir=_RUN_DIR, _c=_counter):
     if not make_file:
-        # remove the file if we don't want it on disk (simulate a non-existent path)
-        try:
-            os.remove(p)
-        except Exception:
-            pass
-        return p  # still returns path that likely does not exist
-    # create and write content
-    with open(p, "w", encoding="utf-8", errors="ignore") as f:
-        if content is None:
-            # write some valid-ish or random content
-            if suffix == ".py":
-                f.write("def fuzz_sample():\n    return " + repr(rand_str(10)) + "\n")
-            else:
-                f.write("label,value\nA,1\nB,2\n")
+        # fresh name that is never created (simulate a non-existent path)
+        return f"{_dir}/fz_{os.getpid()}_{next(_c)}{suffix}"
+    # overwrite the next pooled file with content
+    p = next(_pool_cycle) + suffix
+    if content is None:
+        # write some valid-ish or random content
+        if suffix == ".py":
+            content = "def fuzz_sample():\n    return " + repr(rand_str(10)) + "\n"
         else:
-            f.write(content)
+            content = "label,value\nA,1\nB,2\n"
+    with open(p, "wb", buffering=0) as f:
+        f.write(content.encode("utf-8", errors="ignore"))
     return p
 
+# keyword + filler token pool for rand_code; the random filler tokens are
+# rebuilt every 100 iterations of each process by run_iteration rather than
+# on every call
+_code_parts = _CODE_TOKENS
+
+def refresh_code_filler():
+    global _code_parts
+    _code_parts = _CODE_TOKENS + tuple(rand_str(5) for _ in range(6))
+
+refresh_code_filler()
+
 def rand_code(tokens=20):
-    parts = ["def", "class", "return", "if", "else", "import", "for", "while"]
-    parts += [rand_str(5) for _ in range(6)]
-    return " ".join(random.choice(parts) for _ in range(tokens))
+    return " ".join(_choices(_code_parts, k=tokens))
 
-def rand_stats():
+# top_tokens is filled in place and copied out, because a target may keep a
+# reference to the list it was given
+_TOP_TOKEN_BUF = [""] * 5
+
+def rand_stats(_buf=_TOP_TOKEN_BUF):
+    for k in range(5):
+        _buf[k] = rand_str(5)
     return {
-        "file_count": random.randint(-10, 1000),
-        "avg_tokens": random.random() * 100,
-        "top_tokens": [rand_str(5) for _ in range(5)]
+        "file_count": _randint(-10, 1000),
+        "avg_tokens": _random() * 100,
+        "top_tokens": _buf.copy()
     }
 
 # -------------------------------------------------------------------
@@ -142,128 +274,207 @@ def rand_stats():
 # -------------------------------------------------------------------
 
 FUZZ_LOG = Path("fuzz-results.log")
-FUZZ_LOG.write_text("")  # truncate at start
 FAILURES = []
+# occurrences per crash signature; only the first one is written out
+_SEEN = collections.Counter()
 
-def record_failure(record):
-    # append JSON record to fuzz-results.log and to in-memory list
+# Records wait in _BUF and are written in one chunk per flush, through a
+# handle opened once, instead of an open/write/close per failure.
+FLUSH_EVERY = 64
+TB_LIMIT = 5  # innermost frames kept in a record's "tb"
+# pooled scratch files are overwritten and removed at exit, so the content
+# written for a failing call is kept in its record (capped at INPUT_LIMIT)
+INPUT_LIMIT = 4096
+_BUF = collections.deque()
+_FUZZ_FH = open(FUZZ_LOG, "w", encoding="utf-8", buffering=1 << 16)  # truncate at start
+
+def failure_record(i, ts, meta, args, e, content=None):
+    # keep the raw traceback; it is only formatted when the record is flushed
+    site = e.__traceback__
+    while site.tb_next is not None:
+        site = site.tb_next
+    return {
+        "iteration": i,
+        "time": ts,
+        "module": meta[0],
+        "function": meta[1],
+        "args": args,
+        "input": content[:INPUT_LIMIT] if content is not None else None,
+        "error": str(e),
+        "exc_type": type(e).__name__,
+        "exc_args": repr(e.args),
+        "crash_site": f"{site.tb_frame.f_code.co_filename}:{site.tb_lineno}",
+        "tb": e.__traceback__,
+    }
+
+def failure_signature(record):
+    return (record["module"], record["function"], record["exc_type"], record["crash_site"])
+
+def format_record_tb(record):
+    tb = record.get("tb")
+    if isinstance(tb, types.TracebackType):
+        record["tb"] = traceback.format_list(traceback.extract_tb(tb, limit=-TB_LIMIT))
+    return record
+
+def _serialize(record):
+    format_record_tb(record)
     try:
-        s = json.dumps(record, default=str, indent=2)
+        return _dumps(record)
     except Exception:
-        s = repr(record)
-    with open(FUZZ_LOG, "a", encoding="utf-8") as fh:
-        fh.write(s + "\n\n")
+        return repr(record)
+
+def flush_failures():
+    if _BUF:
+        _FUZZ_FH.write("".join(_serialize(r) + "\n" for r in _BUF))
+        _BUF.clear()
+    _FUZZ_FH.flush()
+
+def _close_fuzz_log():
+    flush_failures()
+    _FUZZ_FH.close()
+
+atexit.register(_close_fuzz_log)
+
+def record_failure(record):
+    # count every failure; buffer and log only the first of each signature
+    key = failure_signature(record)
+    _SEEN[key] += 1
+    if _SEEN[key] > 1:
+        return
+    _BUF.append(record)
+    if len(_BUF) >= FLUSH_EVERY:
+        flush_failures()
     FAILURES.append(record)
-    logger.error("Fuzzer recorded failure", extra={"module": record.get("module"), "function": record.get("function")})
+    logger.error("Fuzzer recorded failure", extra={"fuzz_module": record.get("module"), "fuzz_function": record.get("function")})
 
 # -------------------------------------------------------------------
 # Fuzz harness: sequence of calls similar to original script
 # -------------------------------------------------------------------
 
-def run_iteration(i):
+# Class-based targets are instantiated lazily (so a failing constructor is
+# recorded like any other failure) and reused across iterations. An instance
+# is dropped after it raises, and both are rebuilt every INSTANCE_RESET_EVERY
+# iterations of the process, so state left over from one input cannot pile up.
+INSTANCE_RESET_EVERY = 50
+_LINT_INSTANCE = None
+_REPORT_INSTANCE = None
+
+# Iterations run by this process. Periodic work keys off this rather than the
+# iteration index, since pool workers get arbitrary chunks of the index range.
+_iter_count = 0
+
+def run_iteration(i, _parser=_PARSER_FN, _lint=_LINT_ENGINE, _freq=_FREQ_FN,
+                  _rep=_REPORT_CLS, _miner=_MINER, _lint_path=_LINT_WANTS_PATH,
+                  _lint_cls=_LINT_IS_CLASS, _rep_cls=_REPORT_IS_CLASS,
+                  _parser_meta=_PARSER_META, _lint_meta=_LINT_META,
+                  _freq_meta=_FREQ_META, _rep_meta=_REPORT_META,
+                  _miner_meta=_MINER_META,
+                  _random=_random, _randint=_randint):
+    # returns the failure records instead of logging them, so iterations can
+    # run in worker processes while the parent owns the log files
+    global _LINT_INSTANCE, _REPORT_INSTANCE, _iter_count
     ts = time.time()
+    failures = []
+    n = _iter_count
+    _iter_count += 1
+    if n % 100 == 0:
+        refresh_code_filler()
+    if n % INSTANCE_RESET_EVERY == 0:
+        _LINT_INSTANCE = _REPORT_INSTANCE = None
     # 1) parse_python_file / getPythonParseObject
-    parser_fn = TARGETS.get("parse_python_file") or TARGETS.get("getPythonParseObject")
-    if parser_fn:
+    if _parser:
         try:
             # sometimes create a real file, sometimes pass non-existing path
-            use_file = random.random() < 0.5
-            p = rand_path(suffix=".py", make_file=use_file, content=rand_code(40) if use_file else None)
-            parser_fn(p)
+            p = None
+            use_file = _random() < 0.5
+            content = rand_code(40) if use_file else None
+            p = rand_path(suffix=".py", make_file=use_file, content=content)
+            _parser(p)
         except Exception as e:
-            record_failure({
-                "iteration": i,
-                "time": ts,
-                "module": getattr(parser_fn, "__module__", None),
-                "function": getattr(parser_fn, "__name__", str(parser_fn)),
-                "args": [p],
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
+            failures.append(failure_record(i, ts, _parser_meta, [p], e, content))
 
     # 2) LintEngine.run (class-based)
-    LintEngine = TARGETS.get("LintEngine")
-    if LintEngine:
+    if _lint:
         try:
+            arg = content = None
+            if _lint_path:
+                content = rand_code(10)
+                arg = rand_path(suffix=".py", make_file=True, content=content)
+            else:
+                arg = rand_code(30)
             # if class, instantiate; if function, call directly
-            if isinstance(LintEngine, type):
-                engine = LintEngine()
-                # some engines accept code, file path, or nothing — try several
-                try:
-                    engine.run(rand_code(30))
-                except TypeError:
-                    # try giving a path
-                    p2 = rand_path(suffix=".py", make_file=True, content=rand_code(10))
-                    engine.run(p2)
+            if _lint_cls:
+                if _LINT_INSTANCE is None:
+                    _LINT_INSTANCE = _lint()
+                _LINT_INSTANCE.run(arg)
             else:
                 # function
-                LintEngine(rand_code(30))
+                _lint(arg)
         except Exception as e:
-            record_failure({
-                "iteration": i,
-                "time": ts,
-                "module": getattr(LintEngine, "__module__", None),
-                "function": getattr(LintEngine, "__name__", str(LintEngine)),
-                "args": ["<random code>"],
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
+            _LINT_INSTANCE = None
+            args = [arg] if _lint_path else ["<random code>"]
+            failures.append(failure_record(i, ts, _lint_meta, args, e, content))
 
     # 3) compute_token_frequency / compute_token_frequency
-    freq_fn = TARGETS.get("compute_token_frequency")
-    if freq_fn:
+    if _freq:
         try:
-            # build arbitrary bytes/chars text
-            text = "".join(chr(random.randint(32, 126)) for _ in range(random.randint(10, 500)))
-            freq_fn(text)
+            text = rand_text(_randint(10, 500))
+            _freq(text)
         except Exception as e:
-            record_failure({
-                "iteration": i,
-                "time": ts,
-                "module": getattr(freq_fn, "__module__", None),
-                "function": getattr(freq_fn, "__name__", str(freq_fn)),
-                "args": ["<random text len=%d>" % len(text)],
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
+            failures.append(failure_record(i, ts, _freq_meta, ["<random text len=%d>" % len(text)], e))
 
     # 4) Report.generate (class-based)
-    ReportCls = TARGETS.get("Report")
-    if ReportCls:
+    if _rep:
         try:
-            if isinstance(ReportCls, type):
-                rep = ReportCls()
-                rep.generate(rand_stats())
+            if _rep_cls:
+                if _REPORT_INSTANCE is None:
+                    _REPORT_INSTANCE = _rep()
+                _REPORT_INSTANCE.generate(rand_stats())
             else:
                 # function alternative
-                ReportCls(rand_stats())
+                _rep(rand_stats())
         except Exception as e:
-            record_failure({
-                "iteration": i,
-                "time": ts,
-                "module": getattr(ReportCls, "__module__", None),
-                "function": getattr(ReportCls, "__name__", str(ReportCls)),
-                "args": ["<random stats>"],
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
+            _REPORT_INSTANCE = None
+            failures.append(failure_record(i, ts, _rep_meta, ["<random stats>"], e))
 
     # 5) mine_git_repo / mine_git_repo variant
-    miner = TARGETS.get("mine_git_repo")
-    if miner:
+    if _miner:
         try:
+            fake_path = None
             fake_path = rand_path(suffix="", make_file=False)  # typically non-existent repo path
-            miner(fake_path)
+            _miner(fake_path)
         except Exception as e:
-            record_failure({
-                "iteration": i,
-                "time": ts,
-                "module": getattr(miner, "__module__", None),
-                "function": getattr(miner, "__name__", str(miner)),
-                "args": [fake_path],
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
+            failures.append(failure_record(i, ts, _miner_meta, [fake_path], e))
+
+    return failures
+
+def _init_worker():
+    # independent random streams and scratch file names per worker; the
+    # filler is rebuilt on the worker's first iteration (_iter_count == 0)
+    global _np_rng, _iter_count
+    seed = os.getpid() ^ time.time_ns()
+    _RNG.seed(seed)
+    if np is not None:
+        _np_rng = np.random.default_rng(seed)
+    _reset_path_pool()
+    _iter_count = 0
+    use_direct_handler()
+
+_WORKER_SEEN = set()
+
+def _worker_iteration(i):
+    # traceback objects do not pickle; format them before sending to the
+    # parent, skipping signatures this worker has already sent (the parent
+    # only keeps the first record of a signature)
+    records = run_iteration(i)
+    for r in records:
+        key = failure_signature(r)
+        if key in _WORKER_SEEN:
+            r["tb"] = None
+        else:
+            _WORKER_SEEN.add(key)
+            format_record_tb(r)
+    return records
 
 # -------------------------------------------------------------------
 # Main harness
@@ -271,29 +482,56 @@ def run_iteration(i):
 
 def main():
     iterations = int(os.environ.get("FUZZ_ITERATIONS", "300"))
-    logger.info(f"Fuzzer starting: iterations={iterations}")
+    workers = int(os.environ.get("FUZZ_WORKERS", os.cpu_count() or 1))
+    # workers are forked from this process; without fork, run in-process
+    if "fork" not in multiprocessing.get_all_start_methods():
+        workers = 1
+    logger.info(f"Fuzzer starting: iterations={iterations} workers={workers}")
     start = time.time()
 
-    for i in range(iterations):
-        try:
-            run_iteration(i)
-        finally:
-            # tiny delay to avoid hammering IO too hard
-            if i % 50 == 0:
-                time.sleep(0.01)
+    if workers > 1:
+        ctx = multiprocessing.get_context("fork")
+        # fork while no logging thread runs; workers then log to the file directly
+        with listener_paused():
+            pool = ctx.Pool(workers, initializer=_init_worker)
+        with pool:
+            results = pool.imap_unordered(_worker_iteration, range(iterations), chunksize=16)
+            for n, records in enumerate(results):
+                for r in records:
+                    record_failure(r)
+                if n % 50 == 0:
+                    flush_failures()
+    else:
+        for i in range(iterations):
+            try:
+                for r in run_iteration(i):
+                    record_failure(r)
+            finally:
+                # tiny delay to avoid hammering IO too hard
+                if i % 50 == 0:
+                    flush_failures()
+                    time.sleep(0.01)
+
+    flush_failures()
 
     elapsed = time.time() - start
-    logger.info(f"Fuzzer finished: iterations={iterations} elapsed={elapsed:.2f}s failures={len(FAILURES)}")
+    total = sum(_SEEN.values())
+    logger.info(f"Fuzzer finished: iterations={iterations} elapsed={elapsed:.2f}s failures={total} unique={len(FAILURES)}")
 
     if FAILURES:
         # leave a brief top-level summary file for CI
         summary = {
             "timestamp": time.time(),
             "iterations": iterations,
-            "failures": len(FAILURES),
-            "first_failure": FAILURES[0] if FAILURES else None
+            "failures": total,
+            "unique_failures": len(FAILURES),
+            "first_failure": FAILURES[0] if FAILURES else None,
+            "signatures": [
+                {"module": k[0], "function": k[1], "exc_type": k[2], "crash_site": k[3], "count": n}
+                for k, n in _SEEN.most_common()
+            ]
         }
-        Path("fuzz-summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        Path("fuzz-summary.json").write_text(_dumps(summary, indent=True), encoding="utf-8")
         logger.error("Fuzzer completed with failures; see fuzz-results.log and fuzz-summary.json")
         # exit non-zero so CI fails
         sys.exit(1)